@@ -1,14 +1,49 @@
 import os
 import sys
+import atexit
 import json
+import gzip
 import time
 import random
-import requests
 import logging
-import re
+import logging.handlers
 import asyncio
-import aiohttp
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from pathlib import Path
+from queue import SimpleQueue
+from urllib.parse import urlsplit
+
+# orjson parses the large __NEXT_DATA__ payloads several times faster than the
+# standard library; fall back to json when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ijson streams the search results payload so only the offers get materialised;
+# without it the whole payload is parsed
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# A scalable Bloom filter keeps the seen job keys in a few bytes each instead of
+# full strings; without it a plain set is used
+try:
+    from pybloom_live import ScalableBloomFilter
+except ImportError:
+    ScalableBloomFilter = None
+
+# zstandard compresses the JSONL batches several times over at little CPU cost;
+# without it batches are written uncompressed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Constants
 BASE_URL = "https://it.pracuj.pl/praca"
@@ -17,26 +52,136 @@ DATA_DIR = "job_data"
 PROGRESS_FILE = "scraping_progress.json"
 LOG_FILE = "scraper_log.txt"
 
+# Markers locating the Next.js JSON payload embedded in every page (pages are
+# scanned as raw bytes so the rest of the HTML never has to be decoded)
+NEXT_DATA_ID = b'id="__NEXT_DATA__"'
+NEXT_DATA_CLOSE = b'</script>'
+
+# Next.js also serves each page's props as JSON under /_next/data/<buildId>/[<locale>/], so
+# once the build id is known the listing pages are fetched from there instead of as HTML
+BUILD_ID_KEY = b'"buildId"'
+LOCALE_KEY = b'"locale"'
+
+# Present in every data route response that carries search results
+GROUPED_OFFERS_KEY = b'"groupedOffers"'
+
+# Concurrency limits: listing pages processed at once, and detail requests in flight
+MAX_CONCURRENT_PAGES = 8
+MAX_CONCURRENT_DETAILS = 12
+
+# Page tasks created ahead of time; those beyond MAX_CONCURRENT_PAGES wait on the
+# page semaphore so a new page starts the moment a running one finishes
+PAGE_WINDOW = 2 * MAX_CONCURRENT_PAGES
+
+# Worker processes parsing listing pages so the CPU-bound JSON work stays off the event loop
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Number of job listings written per batch file
+BATCH_SIZE = 100
+
+# File name endings of saved batches: plain and zstd-compressed JSONL, and the
+# JSON arrays written by older runs
+BATCH_SUFFIXES = (".jsonl", ".jsonl.zst", ".json")
+
+# zstd level used for compressed batches
+BATCH_COMPRESSION_LEVEL = 3
+
+# Threads reading saved batch files in parallel at startup
+BATCH_READ_WORKERS = 8
+
+# Pages scraped between progress file writes (progress is also saved when the run ends)
+PROGRESS_SAVE_INTERVAL = 10
+
+# Politeness budget shared by all requests: sustained requests per second and burst size
+REQUESTS_PER_SECOND = 2.0
+REQUEST_BURST = 8
+
 # Environment variable flags (0=disabled, 1=enabled)
 SAVE_RAW_PAGES = os.environ.get('SAVE_RAW_PAGES', '0') == '1'
 SAVE_RAW_JOBS = os.environ.get('SAVE_RAW_JOBS', '0') == '1'
 
+# Optional comma-separated proxy URLs, spread across the client identities
+PROXIES = [proxy for proxy in os.environ.get('PROXIES', '').split(',') if proxy]
+
+# Client identities (User-Agent + cookie jar + proxy) rotated between requests;
+# an identity is replaced after too many uses or too many blocked responses
+IDENTITY_POOL_SIZE = 25
+IDENTITY_MAX_USES = 150
+IDENTITY_MAX_ERRORS = 3
+
+# Only advertise brotli when a decoder is installed, otherwise aiohttp and
+# requests would hand back undecoded bytes
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, br, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
 # Browser-like headers to avoid being detected as a bot
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+# Headers added to data route requests, which return JSON instead of HTML
+DATA_ROUTE_HEADERS = {
+    "Accept": "application/json",
+    "x-nextjs-data": "1",
 }
 
+# User agents rotated between requests to add variety
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15"
+]
+
 # Create necessary directories
-os.makedirs(DATA_DIR, exist_ok=True)
+BATCH_DIR = os.path.join(DATA_DIR, "batches")
+os.makedirs(BATCH_DIR, exist_ok=True)
+
+# Debug dump directories are created once here rather than on every page/job
+RAW_PAGES_DIR = os.path.join(DATA_DIR, "raw_pages")
+RAW_JOBS_DIR = os.path.join(DATA_DIR, "raw_jobs")
+if SAVE_RAW_PAGES:
+    os.makedirs(RAW_PAGES_DIR, exist_ok=True)
+if SAVE_RAW_JOBS:
+    os.makedirs(RAW_JOBS_DIR, exist_ok=True)
+
+def json_loads(data):
+    """Parse JSON from a str or bytes object"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj, indent=False):
+    """Serialize an object (dataclasses included) to UTF-8 encoded JSON bytes"""
+    # orjson serializes dataclasses natively, without building an intermediate dict
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=asdict).encode("utf-8")
+
+# Log lines are queued to a listener thread that owns the (kept open) log file,
+# so the file I/O never runs on the event loop
+logger = logging.getLogger("scraper")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+log_file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+log_file_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+
+log_queue = SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, log_file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 def log_message(message):
     """Log a message with timestamp to the log file"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
-    
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    logger.info(message)
     
     print(message)
 
@@ -60,8 +205,18 @@ def log_timing(operation, start_time, end_time=None):
     log_message(f"TIMING: {operation} took {formatted_duration}")
     return duration
 
+# (current_page, total_pages, jobs_collected) as last written to PROGRESS_FILE
+last_saved_progress = None
+
 def save_progress(current_page, total_pages, jobs_collected):
     """Save current progress to resume later if needed"""
+    global last_saved_progress
+    
+    # Nothing to write if the state hasn't changed since the last save
+    state = (current_page, total_pages, jobs_collected)
+    if state == last_saved_progress:
+        return True
+    
     try:
         progress = {
             "current_page": current_page,
@@ -70,9 +225,14 @@ def save_progress(current_page, total_pages, jobs_collected):
             "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, indent=2)
+        # Write to a temporary file and swap it in, so an interrupted write
+        # never leaves a truncated progress file behind
+        tmp_file = PROGRESS_FILE + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(json_dumps(progress, indent=True))
+        os.replace(tmp_file, PROGRESS_FILE)
         
+        last_saved_progress = state
         return True
     except Exception as e:
         log_message(f"Error saving progress: {e}")
@@ -82,8 +242,8 @@ def load_progress():
     """Load previous progress if it exists"""
     try:
         if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
-                progress = json.load(f)
+            with open(PROGRESS_FILE, 'rb') as f:
+                progress = json_loads(f.read())
             
             current_page = progress.get("current_page", 1)
             total_pages = progress.get("total_pages", None)
@@ -98,18 +258,294 @@ def load_progress():
         log_message(f"Error loading progress: {e}")
         return None, None, 0
 
-def extract_job_data(html):
-    """Extract the job data from the HTML"""
+# ijson prefix of the queries inside a search results or job page __NEXT_DATA__ payload
+PAGE_QUERIES_PREFIX = 'props.pageProps.dehydratedState.queries.item'
+
+# The /_next/data route returns the page props without the 'props' wrapper
+DATA_ROUTE_QUERIES_PREFIX = PAGE_QUERIES_PREFIX.removeprefix('props.')
+
+class AsyncTokenBucket:
+    """Rate limiter shared by all coroutines that spaces out request start times"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                
+                # Refill for the time elapsed since the last update
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def penalize(self, seconds):
+        """Hold back every request for the given number of seconds, e.g. after a 429"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.updated_at = self.blocked_until
+        self.tokens = 0
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on 429s and creeps back up after a run of successes"""
+    
+    def __init__(self, limit, minimum=2, increase_after=20):
+        self.max_limit = limit
+        self.limit = limit
+        self.minimum = minimum
+        self.increase_after = increase_after
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = asyncio.Condition()
+    
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify(max(self.limit - self.in_flight, 0))
+    
+    def decrease(self):
+        """Halve the limit (down to the minimum) after the server pushed back"""
+        self.limit = max(self.minimum, self.limit // 2)
+        self.successes = 0
+        log_message(f"Reducing concurrent requests to {self.limit}")
+    
+    def record_success(self):
+        """Count a successful request, raising the limit by one after enough in a row"""
+        self.successes += 1
+        if self.successes >= self.increase_after and self.limit < self.max_limit:
+            self.limit += 1
+            self.successes = 0
+            log_message(f"Increasing concurrent requests to {self.limit}")
+
+class RateController:
+    """AIMD spacing between page requests to one host: shrinks on success, grows when the server pushes back"""
+    
+    def __init__(self, delay=0.5, minimum=0.2, maximum=15.0):
+        self.delay = delay
+        self.minimum = minimum
+        self.maximum = maximum
+        self.next_allowed = 0.0
+    
+    def ok(self):
+        """Shorten the delay after a successful response"""
+        self.delay = max(self.minimum, self.delay * 0.9)
+    
+    def blocked(self):
+        """Lengthen the delay after a 403/429/5xx response"""
+        self.delay = min(self.maximum, self.delay + 2.0)
+        log_message(f"Rate limiting: page delay raised to {self.delay:.2f} seconds")
+    
+    async def wait(self):
+        """Reserve the next request slot for this host and sleep until it"""
+        # Slots are shared by every page in flight, so requests to the host are
+        # spaced by the delay rather than each page just sleeping on its own
+        now = time.monotonic()
+        self.next_allowed = max(now, self.next_allowed) + self.delay + random.uniform(0, 0.3)
+        await asyncio.sleep(self.next_allowed - now)
+
+@dataclass(slots=True, eq=False)
+class Identity:
+    """One client identity: its own session (cookie jar + User-Agent) and optional proxy"""
+    session: object
+    user_agent: str
+    proxy: str = None
+    uses: int = 0
+    errors: int = 0
+
+class IdentityPool:
+    """Rotating pool of client identities sharing one pooled connector"""
+    
+    def __init__(self, connector, timeout, size=IDENTITY_POOL_SIZE, proxies=PROXIES):
+        self.connector = connector
+        self.timeout = timeout
+        self.proxies = proxies
+        self.created = 0
+        self.closing = set()
+        self.identities = [self.new_identity() for _ in range(size)]
+    
+    def new_identity(self):
+        """Create an identity with a fresh cookie jar and a random User-Agent"""
+        import aiohttp
+        
+        user_agent = random.choice(USER_AGENTS)
+        headers = dict(HEADERS)
+        headers["User-Agent"] = user_agent
+        
+        # Sessions don't own the connector, so every identity reuses the same connection pool
+        session = aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(),
+            timeout=self.timeout,
+            headers=headers
+        )
+        proxy = self.proxies[self.created % len(self.proxies)] if self.proxies else None
+        self.created += 1
+        return Identity(session=session, user_agent=user_agent, proxy=proxy)
+    
+    def retire(self, identity, reason):
+        """Swap an identity out of the pool for a new one"""
+        if identity not in self.identities:
+            return
+        
+        log_message(f"Retiring identity ({reason}): {identity.user_agent}")
+        self.identities.remove(identity)
+        self.identities.append(self.new_identity())
+        
+        # Close its session once any request already started on it has finished or timed out
+        task = asyncio.create_task(self.close_retired(identity))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+    
+    async def close_retired(self, identity):
+        """Close a retired identity's session after the request timeout has passed"""
+        # Closing it straight away would break requests still waiting for a pooled connection
+        try:
+            await asyncio.sleep(self.timeout.total)
+        finally:
+            await identity.session.close()
+    
+    def get(self):
+        """Pick a random identity for the next request"""
+        identity = random.choice(self.identities)
+        identity.uses += 1
+        if identity.uses >= IDENTITY_MAX_USES:
+            self.retire(identity, "usage limit reached")
+        return identity
+    
+    def mark_good(self, identity):
+        """Record a successful response, slowly forgiving earlier errors"""
+        identity.errors = max(0, identity.errors - 1)
+    
+    def mark_bad(self, identity):
+        """Record a blocked response (403/429), retiring the identity after repeated blocks"""
+        identity.errors += 1
+        if identity.errors >= IDENTITY_MAX_ERRORS:
+            self.retire(identity, "blocked too often")
+    
+    async def close(self):
+        """Close every session and the shared connector"""
+        # Retired sessions waiting out their timeout are closed right away
+        for task in list(self.closing):
+            task.cancel()
+        await asyncio.gather(*self.closing, return_exceptions=True)
+        
+        for identity in self.identities:
+            await identity.session.close()
+        await self.connector.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+@dataclass(slots=True)
+class ScrapeContext:
+    """Shared state of one scraping run, passed to every page and detail fetch"""
+    identities: IdentityPool
+    page_semaphore: asyncio.Semaphore
+    detail_limiter: AdaptiveLimiter
+    bucket: AsyncTokenBucket
+    output_queue: asyncio.Queue
+    seen: object
+    parse_executor: ProcessPoolExecutor
+    rate_controllers: dict = field(default_factory=dict)
+    fetching: set = field(default_factory=set)
+    build_id: str = None
+    locale: str = None
+    rejected_build_ids: set = field(default_factory=set)
+    
+    def reject_build_id(self, build_id, reason):
+        """Stop using the data route of a build id for the rest of the run"""
+        self.rejected_build_ids.add(build_id)
+        if self.build_id == build_id:
+            log_message(f"Data route for build {build_id} {reason}, falling back to HTML pages")
+            self.build_id = None
+    
+    def rate_controller(self, url):
+        """Return the page delay controller for the host of the given URL"""
+        host = urlsplit(url).netloc
+        if host not in self.rate_controllers:
+            self.rate_controllers[host] = RateController()
+        return self.rate_controllers[host]
+
+def save_raw_html(path, raw):
+    """Save a raw page body for debugging, gzip-compressed at the fastest level"""
+    with gzip.open(path + ".gz", "wb", compresslevel=1) as f:
+        f.write(raw)
+
+def find_next_data(raw):
+    """Return the raw __NEXT_DATA__ JSON bytes from the page body, or None if missing"""
+    # Three plain substring scans are much cheaper than a regex over the whole page,
+    # and don't depend on the order or spacing of the script tag's attributes
+    marker = raw.find(NEXT_DATA_ID)
+    if marker < 0:
+        return None
+    
+    start = raw.find(b'>', marker)
+    if start < 0:
+        return None
+    start += 1
+    
+    end = raw.find(NEXT_DATA_CLOSE, start)
+    if end < 0:
+        return None
+    
+    return raw[start:end]
+
+def find_json_string(payload, key):
+    """Return the string value of the last occurrence of a quoted key in a JSON payload, or None"""
+    # Next.js writes buildId and locale after the page props, so the last occurrence is the top-level one
+    start = payload.rfind(key)
+    if start == -1:
+        return None
+    
+    # Skip the colon and any whitespace up to the opening quote of the value
+    start = payload.find(b'"', start + len(key))
+    end = payload.find(b'"', start + 1)
+    if start == -1 or end == -1:
+        return None
+    return payload[start + 1:end].decode("utf-8", "replace")
+
+def data_route_url(build_id, page_number, locale=None):
+    """Return the Next.js data route URL of a results page"""
+    parts = urlsplit(BASE_URL)
+    # With i18n routing on, Next.js puts the locale in front of the page path
+    path = f"/{locale}{parts.path}" if locale else parts.path
+    return f"{parts.scheme}://{parts.netloc}/_next/data/{build_id}{path}.json?pn={page_number}"
+
+def extract_job_data(raw):
+    """Extract the job data from the raw page body"""
     # Look for the JSON data in the __NEXT_DATA__ script tag
-    pattern = r'<script\s+id="__NEXT_DATA__"\s+type="application/json">(.*?)</script>'
-    match = re.search(pattern, html)
+    payload = find_next_data(raw)
     
-    if not match:
+    if payload is None:
         log_message("Could not find __NEXT_DATA__ script tag in the HTML")
         return None
     
     try:
-        data = json.loads(match.group(1))
+        data = json_loads(payload)
         return data
     except json.JSONDecodeError as e:
         log_message(f"Error parsing JSON: {e}")
@@ -168,11 +604,52 @@ def get_total_pages(data):
         # Fallback to a reasonable default if all else fails
         return 900, 18000  # Assuming ~20 jobs per page
 
-def extract_job_listings(data):
-    """Extract basic info for all job listings from the search results data"""
+@dataclass(slots=True)
+class JobListing:
+    """A single job offer; detailed info fields are filled in by extract_job_details"""
+    id: str
+    title: str
+    company: str
+    location: str
+    technologies: list
+    is_one_click_apply: bool
+    position_level: list
+    contract_types: list
+    work_schedules: list
+    work_modes: list
+    salary: str
+    description: str
+    url: str
+    scraped_at: str
+    requirements: list = field(default_factory=list)
+    responsibilities: list = field(default_factory=list)
+    offered: list = field(default_factory=list)
+    benefits: list = field(default_factory=list)
+    work_organization: dict = field(default_factory=dict)
+
+def iter_grouped_offers(payload, data_route=False):
+    """Yield the offers of a search results __NEXT_DATA__ or data route payload"""
+    if ijson is not None:
+        # The search results are in the first query only; stop reading once it has been parsed
+        queries = ijson.items(payload, DATA_ROUTE_QUERIES_PREFIX if data_route else PAGE_QUERIES_PREFIX, use_float=True)
+        first_query = next(queries, None)
+        if first_query is not None:
+            yield from first_query['state']['data']['groupedOffers']
+        return
+    
+    data = json_loads(payload)
+    if not data_route:
+        data = data['props']
+    yield from data['pageProps']['dehydratedState']['queries'][0]['state']['data']['groupedOffers']
+
+def extract_job_listings(payload, data_route=False):
+    """Extract basic info for all job listings from the raw search results payload"""
     try:
-        # Navigate to job offers
-        grouped_offers = data['props']['pageProps']['dehydratedState']['queries'][0]['state']['data']['groupedOffers']
+        # Iterate over job offers without keeping the rest of the payload around
+        grouped_offers = iter_grouped_offers(payload, data_route)
+        
+        # All jobs on the page share one scrape timestamp
+        scraped_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         job_listings = []
         for offer in grouped_offers:
@@ -199,28 +676,22 @@ def extract_job_listings(data):
                 job_description = offer.get('jobDescription', '')
                 
                 # Create job listing object with basic info
-                job_listing = {
-                    "id": job_id,
-                    "title": job_title,
-                    "company": company_name,
-                    "location": workplace,
-                    "technologies": technologies,
-                    "is_one_click_apply": is_one_click,
-                    "position_level": position_levels,
-                    "contract_types": contract_types,
-                    "work_schedules": work_schedules,
-                    "work_modes": work_modes,
-                    "salary": salary,
-                    "description": job_description,
-                    "url": url,
-                    "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    # Initialize detailed info fields as empty
-                    "requirements": [],
-                    "responsibilities": [],
-                    "offered": [],
-                    "benefits": [],
-                    "work_organization": {}
-                }
+                job_listing = JobListing(
+                    id=job_id,
+                    title=job_title,
+                    company=company_name,
+                    location=workplace,
+                    technologies=technologies,
+                    is_one_click_apply=is_one_click,
+                    position_level=position_levels,
+                    contract_types=contract_types,
+                    work_schedules=work_schedules,
+                    work_modes=work_modes,
+                    salary=salary,
+                    description=job_description,
+                    url=url,
+                    scraped_at=scraped_at
+                )
                 
                 job_listings.append(job_listing)
                 
@@ -230,155 +701,157 @@ def extract_job_listings(data):
         
         return job_listings
     
-    except KeyError as e:
+    except Exception as e:
         log_message(f"Error navigating JSON structure: {e}")
         return []
 
-def extract_job_details(html, job_listing):
-    """Extract detailed information from a specific job listing page"""
+def parse_listing_page(raw, data_route=False):
+    """Extract the job listings from a raw search results page, or None if it has no job data"""
+    # Data route responses are the page props themselves, with no HTML around them
+    payload = raw if data_route else find_next_data(raw)
+    if payload is None:
+        return None
+    return extract_job_listings(payload, data_route)
+
+def iter_page_queries(payload):
+    """Yield the dehydratedState queries of a job page __NEXT_DATA__ payload"""
+    if ijson is not None:
+        yield from ijson.items(payload, PAGE_QUERIES_PREFIX, use_float=True)
+        return
+    
+    data = json_loads(payload)
+    yield from data['props']['pageProps']['dehydratedState']['queries']
+
+def collect_item_names(model):
+    """Collect the 'name' of every entry in a section model's customItems and items"""
+    names = []
+    
+    for key in ('customItems', 'items'):
+        for item in model.get(key, []):
+            if 'name' in item:
+                names.append(item['name'])
+    
+    return names
+
+def handle_technologies_section(section, job_listing):
+    """Add expected technologies to the job listing"""
+    for subsection in section.get('subSections', []):
+        if subsection.get('sectionType') == 'technologies-expected' and 'model' in subsection:
+            # Track seen names in a set, appending in page order so output stays stable
+            technologies = job_listing.technologies
+            seen = set(technologies)
+            for tech in collect_item_names(subsection['model']):
+                if tech not in seen:
+                    technologies.append(tech)
+                    seen.add(tech)
+
+def handle_requirements_section(section, job_listing):
+    """Add requirement bullets from every subsection to the job listing"""
+    # Gather all bullets first so the list grows once per section
+    job_listing.requirements += [
+        bullet
+        for subsection in section.get('subSections', [])
+        if 'model' in subsection and 'bullets' in subsection['model']
+        for bullet in subsection['model']['bullets']
+    ]
+
+def handle_responsibilities_section(section, job_listing):
+    """Set the job listing responsibilities"""
+    if 'model' in section and 'bullets' in section['model']:
+        job_listing.responsibilities = section['model']['bullets']
+
+def handle_offered_section(section, job_listing):
+    """Set what the company offers"""
+    if 'model' in section and 'bullets' in section['model']:
+        job_listing.offered = section['model']['bullets']
+
+def handle_benefits_section(section, job_listing):
+    """Set the job listing benefits"""
+    if 'model' in section:
+        job_listing.benefits = collect_item_names(section['model'])
+
+def handle_work_organization_section(section, job_listing):
+    """Set team size, work style and team members"""
+    if 'subSections' not in section:
+        return
+    
+    work_organization = {}
+    
+    for subsection in section['subSections']:
+        subsection_type = subsection.get('sectionType', '')
+        model = subsection.get('model', {})
+        
+        if subsection_type == 'work-organization-team-size' and 'paragraphs' in model:
+            work_organization['team_size'] = model['paragraphs'][0] if model['paragraphs'] else ''
+        
+        elif subsection_type == 'work-organization-work-style' and 'items' in model:
+            work_organization['work_style'] = [item['name'] for item in model['items'] if 'name' in item]
+        
+        elif subsection_type == 'work-organization-team-members' and 'items' in model:
+            work_organization['team_members'] = [item['name'] for item in model['items'] if 'name' in item]
+    
+    job_listing.work_organization = work_organization
+
+# Handlers for the structured 'sections' of a job offer, keyed by sectionType
+SECTION_HANDLERS = {
+    'technologies': handle_technologies_section,
+    'requirements': handle_requirements_section,
+    'responsibilities': handle_responsibilities_section,
+    'offered': handle_offered_section,
+    'benefits': handle_benefits_section,
+    'work-organization': handle_work_organization_section,
+}
+
+# Job listing fields filled from 'textSections' when the structured sections left them empty
+TEXT_SECTION_FIELDS = {
+    'technologies-expected': 'technologies',
+    'requirements-expected': 'requirements',
+    'responsibilities': 'responsibilities',
+    'offered': 'offered',
+    'benefits': 'benefits',
+}
+
+def extract_job_details(raw, job_listing):
+    """Extract detailed information from the raw body of a job listing page"""
     try:
+        # Error and captcha pages carry no job offer; skip them before any parsing
+        if b'"jobOffer"' not in raw:
+            log_message(f"No job offer data in page for job {job_listing.id}")
+            return job_listing
+        
         # Find the JSON data in the script tag
-        match = re.search(r'<script id="__NEXT_DATA__" type="application\/json">(.*?)<\/script>', html, re.DOTALL)
-        if not match:
-            log_message(f"Could not find job data in HTML for job {job_listing['id']}")
+        payload = find_next_data(raw)
+        if payload is None:
+            log_message(f"Could not find job data in HTML for job {job_listing.id}")
+            return job_listing
+        
+        # Only job offer pages carry an offerId
+        if b'"offerId"' not in payload:
+            log_message(f"Unexpected JSON structure for job {job_listing.id}")
             return job_listing
         
-        # Parse the JSON data
-        job_data = json.loads(match.group(1))
+        # Look for the query containing job offer data; parsing stops as soon as it's found
+        job_offer_data = None
+        for query in iter_page_queries(payload):
+            if 'queryKey' in query and query['queryKey'][0] == 'jobOffer':
+                if 'state' in query and 'data' in query['state']:
+                    job_offer_data = query['state']['data']
+                    break
         
-        # Check if we have the expected structure
-        if 'props' not in job_data or 'pageProps' not in job_data['props']:
-            log_message(f"Unexpected JSON structure for job {job_listing['id']}")
+        if not job_offer_data:
             return job_listing
         
-        # Try to extract the job offer info
-        if 'offerId' in job_data['props']['pageProps']:
-            # Get all queries from dehydratedState
-            if 'dehydratedState' in job_data['props']['pageProps'] and 'queries' in job_data['props']['pageProps']['dehydratedState']:
-                queries = job_data['props']['pageProps']['dehydratedState']['queries']
-                
-                # Look for the query containing job offer data
-                job_offer_data = None
-                for query in queries:
-                    if 'queryKey' in query and query['queryKey'][0] == 'jobOffer':
-                        if 'state' in query and 'data' in query['state']:
-                            job_offer_data = query['state']['data']
-                            break
-                
-                if job_offer_data:
-                    # Extract sections data if available
-                    if 'sections' in job_offer_data:
-                        sections = job_offer_data['sections']
-                        
-                        # Process each section type
-                        for section in sections:
-                            section_type = section.get('sectionType', '')
-                            
-                            # Extract technologies
-                            if section_type == 'technologies' and 'subSections' in section:
-                                for subsection in section['subSections']:
-                                    if subsection.get('sectionType') == 'technologies-expected' and 'model' in subsection:
-                                        tech_items = []
-                                        
-                                        # Extract from customItems
-                                        if 'customItems' in subsection['model']:
-                                            for item in subsection['model']['customItems']:
-                                                if 'name' in item and item['name'] not in tech_items:
-                                                    tech_items.append(item['name'])
-                                        
-                                        # Extract from items
-                                        if 'items' in subsection['model']:
-                                            for item in subsection['model']['items']:
-                                                if 'name' in item and item['name'] not in tech_items:
-                                                    tech_items.append(item['name'])
-                                        
-                                        # Add to existing technologies
-                                        for tech in tech_items:
-                                            if tech not in job_listing['technologies']:
-                                                job_listing['technologies'].append(tech)
-                            
-                            # Extract requirements
-                            elif section_type == 'requirements' and 'subSections' in section:
-                                for subsection in section['subSections']:
-                                    if 'model' in subsection and 'bullets' in subsection['model']:
-                                        job_listing['requirements'].extend(subsection['model']['bullets'])
-                            
-                            # Extract responsibilities
-                            elif section_type == 'responsibilities' and 'model' in section and 'bullets' in section['model']:
-                                job_listing['responsibilities'] = section['model']['bullets']
-                            
-                            # Extract what company offers
-                            elif section_type == 'offered' and 'model' in section and 'bullets' in section['model']:
-                                job_listing['offered'] = section['model']['bullets']
-                            
-                            # Extract benefits
-                            elif section_type == 'benefits' and 'model' in section:
-                                benefits = []
-                                
-                                # Extract from customItems
-                                if 'customItems' in section['model']:
-                                    for item in section['model']['customItems']:
-                                        if 'name' in item:
-                                            benefits.append(item['name'])
-                                
-                                # Extract from items
-                                if 'items' in section['model']:
-                                    for item in section['model']['items']:
-                                        if 'name' in item:
-                                            benefits.append(item['name'])
-                                
-                                job_listing['benefits'] = benefits
-                            
-                            # Extract work organization
-                            elif section_type == 'work-organization' and 'subSections' in section:
-                                work_organization = {}
-                                
-                                for subsection in section['subSections']:
-                                    subsection_type = subsection.get('sectionType', '')
-                                    
-                                    if subsection_type == 'work-organization-team-size' and 'model' in subsection and 'paragraphs' in subsection['model']:
-                                        work_organization['team_size'] = subsection['model']['paragraphs'][0] if subsection['model']['paragraphs'] else ''
-                                    
-                                    elif subsection_type == 'work-organization-work-style' and 'model' in subsection and 'items' in subsection['model']:
-                                        work_styles = []
-                                        for item in subsection['model']['items']:
-                                            if 'name' in item:
-                                                work_styles.append(item['name'])
-                                        work_organization['work_style'] = work_styles
-                                    
-                                    elif subsection_type == 'work-organization-team-members' and 'model' in subsection and 'items' in subsection['model']:
-                                        team_members = []
-                                        for item in subsection['model']['items']:
-                                            if 'name' in item:
-                                                team_members.append(item['name'])
-                                        work_organization['team_members'] = team_members
-                                
-                                job_listing['work_organization'] = work_organization
-                    
-                    # Try to extract from textSections if available
-                    if 'textSections' in job_offer_data:
-                        for section in job_offer_data['textSections']:
-                            section_type = section.get('sectionType', '')
-                            
-                            # Backup for technologies
-                            if section_type == 'technologies-expected' and 'textElements' in section and not job_listing['technologies']:
-                                job_listing['technologies'] = section['textElements']
-                            
-                            # Backup for requirements
-                            elif section_type == 'requirements-expected' and 'textElements' in section and not job_listing['requirements']:
-                                job_listing['requirements'] = section['textElements']
-                            
-                            # Backup for responsibilities
-                            elif section_type == 'responsibilities' and 'textElements' in section and not job_listing['responsibilities']:
-                                job_listing['responsibilities'] = section['textElements']
-                            
-                            # Backup for offered
-                            elif section_type == 'offered' and 'textElements' in section and not job_listing['offered']:
-                                job_listing['offered'] = section['textElements']
-                            
-                            # Backup for benefits
-                            elif section_type == 'benefits' and 'textElements' in section and not job_listing['benefits']:
-                                job_listing['benefits'] = section['textElements']
+        # Dispatch each section to its handler
+        for section in job_offer_data.get('sections', []):
+            handler = SECTION_HANDLERS.get(section.get('sectionType', ''))
+            if handler:
+                handler(section, job_listing)
+        
+        # Use textSections as a backup for anything still empty
+        for section in job_offer_data.get('textSections', []):
+            field = TEXT_SECTION_FIELDS.get(section.get('sectionType', ''))
+            if field and 'textElements' in section and not getattr(job_listing, field):
+                setattr(job_listing, field, section['textElements'])
         
         return job_listing
     
@@ -386,171 +859,123 @@ def extract_job_details(html, job_listing):
         log_message(f"Error extracting detailed job info: {e}")
         return job_listing
 
-async def fetch_job_details_async(job_listings, max_concurrent=12):
-    """Fetch detailed information for each job listing asynchronously"""
-    if not job_listings:
-        log_message("No job listings provided for detail fetching")
-        return []
+def create_identity_pool():
+    """Create the identity pool used by every listing and detail request of a run"""
+    # Imported here so runs that never reach the scraping loop skip its startup cost
+    import aiohttp
     
-    log_message(f"Fetching details for {len(job_listings)} jobs asynchronously (max_concurrent={max_concurrent})")
-    enhanced_listings = []
-    
-    # Create a semaphore to limit concurrent requests
-    semaphore = asyncio.Semaphore(max_concurrent)
-    
-    # Create a shared session timeout configuration
     timeout = aiohttp.ClientTimeout(total=30, connect=10, sock_connect=10, sock_read=15)
     
-    # Create headers with a random user agent
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15"
-    ]
+    # Share one pooled connector so TCP/TLS setup is paid once per connection, not per request
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONCURRENT_PAGES + MAX_CONCURRENT_DETAILS,
+        limit_per_host=MAX_CONCURRENT_DETAILS,
+        keepalive_timeout=30
+    )
+    return IdentityPool(connector, timeout)
+
+async def fetch_job_details_async(context, job_listings):
+    """Fetch detailed information for each job listing and queue finished jobs for saving"""
+    if not job_listings:
+        log_message("No job listings provided for detail fetching")
+        return 0
+    
+    log_message(f"Fetching details for {len(job_listings)} jobs asynchronously")
+    identities = context.identities
+    limiter = context.detail_limiter
+    bucket = context.bucket
     
-    async def fetch_one_job(job, job_index):
-        """Fetch details for a single job"""
-        async with semaphore:
+    async def fetch_one_job(job):
+        """Fetch details for a single job, returning None if they couldn't be fetched"""
+        async with limiter:
             try:
-                # Add dynamic delay based on job index to avoid too many requests
-                # More aggressive rate limiting: base delay of 4-8 seconds
-                delay = 4.0 + random.uniform(1.0, 4.0) + (0.2 * (job_index // 3))
-                log_message(f"Delaying request for job {job['id']} by {delay:.2f} seconds")
-                await asyncio.sleep(delay)
+                # Wait for the shared rate limiter rather than sleeping per request
+                await bucket.acquire()
                 
-                # Use a new session for each request but with shared cookies
-                # Create a copy of headers with a random user agent
-                headers = dict(HEADERS)
-                headers["User-Agent"] = random.choice(user_agents)
+                # Rotate the identity and Referer per request
+                identity = identities.get()
+                referers = [
+                    "https://www.pracuj.pl/praca",
+                    f"https://www.pracuj.pl/praca?pn={random.randint(1, 10)}",
+                    "https://www.pracuj.pl/praca/it",
+                    "https://www.google.com/search?q=pracuj+pl+jobs"
+                ]
+                headers = {"Referer": random.choice(referers)}
                 
-                async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-                    # Add a random "Referer" header to simulate coming from various pages
-                    referers = [
-                        "https://www.pracuj.pl/praca",
-                        f"https://www.pracuj.pl/praca?pn={random.randint(1, 10)}",
-                        "https://www.pracuj.pl/praca/it",
-                        "https://www.google.com/search?q=pracuj+pl+jobs"
-                    ]
-                    headers["Referer"] = random.choice(referers)
+                async with identity.session.get(job.url, headers=headers, proxy=identity.proxy) as response:
+                    if response.status != 200:
+                        log_message(f"Failed to fetch details for job {job.id}: HTTP {response.status}")
+                        # Drain the (small) error body so the connection can go back to the pool
+                        await response.read()
+                        if response.status in (403, 429):
+                            identities.mark_bad(identity)
+                        if response.status == 429:  # Too Many Requests
+                            log_message("Received 429 Too Many Requests - pausing all requests")
+                            bucket.penalize(90 + random.uniform(0, 30))  # Add a 1.5-2 minute delay
+                            limiter.decrease()
+                        return None
+                    
+                    identities.mark_good(identity)
+                    limiter.record_success()
+                    
+                    # Read the body as bytes; only the __NEXT_DATA__ slice is ever parsed
+                    raw = await response.read()
                     
-                    async with session.get(job['url']) as response:
-                        if response.status != 200:
-                            log_message(f"Failed to fetch details for job {job['id']}: HTTP {response.status}")
-                            if response.status == 429:  # Too Many Requests
-                                log_message("Received 429 Too Many Requests - adding extra delay")
-                                await asyncio.sleep(90 + random.uniform(0, 30))  # Add a 1.5-2 minute delay
-                            return job
-                        
-                        html = await response.text()
-                        
-                        # Save raw job HTML for debugging only if enabled
-                        if SAVE_RAW_JOBS:
-                            job_dir = os.path.join(DATA_DIR, "raw_jobs")
-                            os.makedirs(job_dir, exist_ok=True)
-                            with open(os.path.join(job_dir, f"job_{job['id']}.html"), 'w', encoding='utf-8') as f:
-                                f.write(html)
-                        
-                        # Extract job details from HTML
-                        extract_job_details(html, job)
-                        return job
+                    # Save raw job HTML for debugging only if enabled
+                    if SAVE_RAW_JOBS:
+                        save_raw_html(os.path.join(RAW_JOBS_DIR, f"job_{job.id}.html"), raw)
+                    
+                    # Extract job details from HTML
+                    extract_job_details(raw, job)
+                    return job
             
             except Exception as e:
-                log_message(f"Error fetching details for job {job['id']}: {e}")
-                return job
+                log_message(f"Error fetching details for job {job.id}: {e}")
+                return None
     
     # Create tasks for all jobs
-    tasks = [fetch_one_job(job, i) for i, job in enumerate(job_listings)]
-    
-    # Wait for all tasks to complete
-    results = await asyncio.gather(*tasks)
+    tasks = [asyncio.create_task(fetch_one_job(job)) for job in job_listings]
     
-    # Filter out None results
-    enhanced_listings = [job for job in results if job]
-    
-    log_message(f"Successfully fetched details for {len(enhanced_listings)} jobs")
-    return enhanced_listings
-
-def fetch_job_details(job_listings, max_concurrent=12):
-    """Synchronous wrapper for async fetch_job_details_async function"""
+    # Hand each job to the batch writer as soon as it is done, instead of
+    # holding the whole page until its slowest request finishes; jobs whose
+    # details couldn't be fetched are neither saved nor marked as seen, so a
+    # later page or run can try them again
+    fetched = 0
     try:
-        return asyncio.run(fetch_job_details_async(job_listings, max_concurrent))
-    except Exception as e:
-        log_message(f"Error in fetch_job_details: {e}")
-        # Fallback to synchronous fetching if async fails
-        return fetch_job_details_sync(job_listings)
-
-def fetch_job_details_sync(job_listings):
-    """Fetch detailed information for each job listing synchronously (fallback)"""
-    if not job_listings:
-        log_message("No job listings provided for detail fetching")
-        return []
-    
-    log_message(f"Fetching details for {len(job_listings)} jobs synchronously")
-    enhanced_listings = []
-    
-    # Create a session for all requests to maintain cookies
-    session = get_session()
-    
-    for job in job_listings:
-        try:
-            log_message(f"Fetching details for job {job['id']}: {job['title']}")
-            
-            # Add delay with some randomness to mimic human behavior
-            delay = random.uniform(3, 7)
-            log_message(f"Waiting {delay:.2f} seconds before requesting job details")
-            time.sleep(delay)
-            
-            # Use session instead of direct requests
-            response = session.get(job['url'])
-            
-            if response.status_code != 200:
-                log_message(f"Failed to fetch details for job {job['id']}: HTTP {response.status_code}")
-                if response.status_code == 429:  # Too Many Requests
-                    log_message("Received 429 Too Many Requests - adding extra delay")
-                    time.sleep(60 + random.uniform(0, 30))  # Add a 1-1.5 minute delay
-                enhanced_listings.append(job)
-                continue
-            
-            html = response.text
-            
-            # Save raw job HTML for debugging only if enabled
-            if SAVE_RAW_JOBS:
-                job_dir = os.path.join(DATA_DIR, "raw_jobs")
-                os.makedirs(job_dir, exist_ok=True)
-                with open(os.path.join(job_dir, f"job_{job['id']}.html"), 'w', encoding='utf-8') as f:
-                    f.write(html)
-            
-            # Extract job details from HTML
-            extract_job_details(html, job)
-            enhanced_listings.append(job)
-            
-        except Exception as e:
-            log_message(f"Error fetching details for job {job['id']}: {e}")
-            enhanced_listings.append(job)
+        for next_job in asyncio.as_completed(tasks):
+            job = await next_job
+            if job:
+                context.seen.add(job_key(job.title, job.company, job.location))
+                await context.output_queue.put(job)
+                fetched += 1
+    finally:
+        # Don't leave requests running if the run is interrupted
+        for task in tasks:
+            task.cancel()
+        for job in job_listings:
+            context.fetching.discard(job_key(job.title, job.company, job.location))
     
-    log_message(f"Successfully fetched details for {len(enhanced_listings)} jobs")
-    return enhanced_listings
+    log_message(f"Successfully fetched details for {fetched} jobs")
+    return fetched
 
 def get_session():
     """Create and return a requests Session with persistent cookies and randomized User-Agent"""
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15"
-    ]
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     
     session = requests.Session()
     
+    # Keep connections alive between requests and retry transient failures with backoff
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries))
+    
     # Copy all headers to the session
     for key, value in HEADERS.items():
         session.headers[key] = value
     
     # Set a random User-Agent from our list to add variety
-    session.headers["User-Agent"] = random.choice(user_agents)
+    session.headers["User-Agent"] = random.choice(USER_AGENTS)
     
     # Enable cookie persistence
     session.cookies.clear_session_cookies()
@@ -558,124 +983,366 @@ def get_session():
     log_message(f"Created new session with User-Agent: {session.headers['User-Agent']}")
     return session
 
-def scrape_page(page_number):
-    """Scrape a specific page of job listings"""
-    url = f"{BASE_URL}?pn={page_number}"
+async def fetch_listing_page(context, page_number):
+    """Download a results page, preferring the Next.js data route; returns (raw, data_route) or None"""
+    identities = context.identities
+    bucket = context.bucket
     
-    page_start_time = time.time()
-    try:
-        # Make the request
-        log_message(f"Fetching page {page_number} from {url}")
-        request_start = time.time()
-        response = requests.get(url, headers=HEADERS)
-        request_end = time.time()
-        log_timing(f"HTTP request for page {page_number}", request_start, request_end)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            log_message(f"Failed to fetch page {page_number}: HTTP {response.status_code}")
-            return []
+    # The data route and the HTML pages are served by the same host
+    rate_controller = context.rate_controller(BASE_URL)
+    
+    while True:
+        # Wait out the adaptive page delay, then the rate limiter
+        await rate_controller.wait()
+        await bucket.acquire()
         
-        # Save the raw HTML for debugging only if enabled
-        if SAVE_RAW_PAGES:
-            raw_dir = os.path.join(DATA_DIR, "raw_pages")
-            os.makedirs(raw_dir, exist_ok=True)
-            with open(os.path.join(raw_dir, f"page_{page_number}.html"), 'w', encoding='utf-8') as f:
-                f.write(response.text)
-        
-        # Extract job data
-        extraction_start = time.time()
-        job_data = extract_job_data(response.text)
-        if not job_data:
-            log_message(f"No job data found on page {page_number}")
-            return []
+        # Pick the route only now, so a build id learned by another page during the wait is used
+        build_id = context.build_id
+        data_route = build_id is not None
+        url = data_route_url(build_id, page_number, context.locale) if data_route else f"{BASE_URL}?pn={page_number}"
+        log_message(f"Fetching page {page_number} from {url}")
+        identity = identities.get()
+        async with identity.session.get(url, proxy=identity.proxy, headers=DATA_ROUTE_HEADERS if data_route else None) as response:
+            # Check if the request was successful
+            if response.status != 200:
+                log_message(f"Failed to fetch page {page_number}: HTTP {response.status}")
+                # Drain the (small) error body so the connection can go back to the pool
+                await response.read()
+                
+                # The build id is stale or the route isn't served: fall back to the HTML page,
+                # which carries the current id if the site was redeployed
+                if data_route and response.status == 404:
+                    context.reject_build_id(build_id, "returned HTTP 404")
+                    continue
+                
+                if response.status in (403, 429) or response.status >= 500:
+                    rate_controller.blocked()
+                if response.status in (403, 429):
+                    identities.mark_bad(identity)
+                if response.status == 429:  # Too Many Requests
+                    bucket.penalize(90 + random.uniform(0, 30))
+                return None
+            
+            identities.mark_good(identity)
+            rate_controller.ok()
+            raw = await response.read()
         
-        # Extract job listings
-        job_listings = extract_job_listings(job_data)
-        extraction_end = time.time()
-        log_timing(f"Data extraction for page {page_number}", extraction_start, extraction_end)
+        # A redirect, captcha or error page instead of the search results: retry the page as HTML
+        if data_route and GROUPED_OFFERS_KEY not in raw:
+            context.reject_build_id(build_id, "returned no search results")
+            continue
         
-        if not job_listings:
-            log_message(f"No job listings found on page {page_number}")
-            return []
+        # Switch the remaining pages to the data route once a build id is known that hasn't failed before
+        if not data_route and context.build_id is None:
+            payload = find_next_data(raw)
+            new_build_id = find_json_string(payload, BUILD_ID_KEY) if payload is not None else None
+            if new_build_id and new_build_id not in context.rejected_build_ids:
+                context.build_id = new_build_id
+                context.locale = find_json_string(payload, LOCALE_KEY)
+                log_message(f"Using the Next.js data route for build {context.build_id}")
         
-        # Fetch detailed information for each job listing
-        log_message(f"Fetching detailed information for {len(job_listings)} jobs on page {page_number}")
-        detail_start = time.time()
-        enhanced_listings = fetch_job_details(job_listings)
-        detail_end = time.time()
-        log_timing(f"Fetching details for {len(job_listings)} jobs on page {page_number}", detail_start, detail_end)
+        return raw, data_route
+
+async def scrape_page_async(context, page_number):
+    """Scrape a specific page of job listings, returning the number of jobs queued for saving"""
+    async with context.page_semaphore:
+        page_start_time = time.time()
+        try:
+            request_start = time.time()
+            fetched = await fetch_listing_page(context, page_number)
+            if fetched is None:
+                return 0
+            raw, data_route = fetched
+            request_end = time.time()
+            log_timing(f"HTTP request for page {page_number}", request_start, request_end)
+            
+            # Save the raw HTML for debugging only if enabled
+            if SAVE_RAW_PAGES:
+                save_raw_html(os.path.join(RAW_PAGES_DIR, f"page_{page_number}.{'json' if data_route else 'html'}"), raw)
+            
+            # Extract job listings in a worker process
+            extraction_start = time.time()
+            loop = asyncio.get_running_loop()
+            job_listings = await loop.run_in_executor(context.parse_executor, parse_listing_page, raw, data_route)
+            if job_listings is None:
+                log_message(f"No job data found on page {page_number}")
+                return 0
+            extraction_end = time.time()
+            log_timing(f"Data extraction for page {page_number}", extraction_start, extraction_end)
+            
+            if not job_listings:
+                log_message(f"No job listings found on page {page_number}")
+                return 0
+            
+            # Skip jobs already saved, or being fetched by another page, before spending requests on their details
+            new_listings = []
+            for job in job_listings:
+                key = job_key(job.title, job.company, job.location)
+                if key not in context.seen and key not in context.fetching:
+                    context.fetching.add(key)
+                    new_listings.append(job)
+            
+            if len(new_listings) < len(job_listings):
+                log_message(f"Skipping {len(job_listings) - len(new_listings)} already saved or in-progress jobs on page {page_number}")
+            job_listings = new_listings
+            if not job_listings:
+                return 0
+            
+            # Fetch detailed information for each job listing
+            log_message(f"Fetching detailed information for {len(job_listings)} jobs on page {page_number}")
+            detail_start = time.time()
+            jobs_fetched = await fetch_job_details_async(context, job_listings)
+            detail_end = time.time()
+            log_timing(f"Fetching details for {len(job_listings)} jobs on page {page_number}", detail_start, detail_end)
+            
+            page_end_time = time.time()
+            log_timing(f"Complete processing of page {page_number}", page_start_time, page_end_time)
+            log_message(f"Successfully scraped {jobs_fetched} jobs from page {page_number}")
+            return jobs_fetched
         
-        page_end_time = time.time()
-        log_timing(f"Complete processing of page {page_number}", page_start_time, page_end_time)
-        log_message(f"Successfully scraped {len(enhanced_listings)} jobs from page {page_number}")
-        return enhanced_listings
+        except Exception as e:
+            page_end_time = time.time()
+            log_timing(f"Failed processing of page {page_number}", page_start_time, page_end_time)
+            log_message(f"Error scraping page {page_number}: {e}")
+            return 0
+
+def job_key(title, company, location):
+    """Key used to recognise the same job offer across pages, batches and runs"""
+    return f"{title}_{company}_{location}"
+
+def new_seen_set():
+    """Create the container tracking which job keys have already been saved"""
+    if ScalableBloomFilter is not None:
+        return ScalableBloomFilter(initial_capacity=100_000, error_rate=1e-6)
+    return set()
+
+def batch_index(path):
+    """Return the batch number of a jobs_batch_<n> file, or None if it isn't a batch file"""
+    if not path.name.endswith(BATCH_SUFFIXES):
+        return None
     
-    except Exception as e:
-        page_end_time = time.time()
-        log_timing(f"Failed processing of page {page_number}", page_start_time, page_end_time)
-        log_message(f"Error scraping page {page_number}: {e}")
-        return []
+    number = path.name[len("jobs_batch_"):].split(".")[0]
+    return int(number) if number.isdigit() else None
+
+def list_batch_files():
+    """Return the saved batch files of every partition ordered by batch number"""
+    # Matches .jsonl and .jsonl.zst batches and the .json arrays written by older runs,
+    # both inside the date partitions and directly in BATCH_DIR
+    # Stray files such as copies with other names are left alone
+    paths = [path for path in Path(BATCH_DIR).glob("**/jobs_batch_*.json*") if batch_index(path) is not None]
+    return sorted(paths, key=batch_index)
+
+def read_batch_bytes(path):
+    """Return the contents of a batch file, decompressing .zst batches"""
+    if path.suffix == ".zst":
+        with open(path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as reader:
+            return reader.read()
+    return path.read_bytes()
+
+def iter_batch_jobs(path):
+    """Yield the jobs stored in a batch file one at a time"""
+    # Batches from older runs hold a single JSON array
+    if path.suffix == ".json":
+        yield from json_loads(path.read_bytes())
+        return
+    
+    # A crash during an append can leave a truncated last line; skip just the lines that don't parse
+    for line_number, line in enumerate(read_batch_bytes(path).splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            job = json_loads(line)
+        except ValueError as e:
+            log_message(f"Skipping undecodable line {line_number} of batch file {path}: {e}")
+            continue
+        yield job
 
-def add_rate_limiting_delay(current_page):
-    """Add a delay between requests with exponential backoff for higher page numbers"""
-    # Base delay between 3-5 seconds
-    base_delay = random.uniform(3, 5)
+def load_seen_jobs():
+    """Rebuild the set of already saved job keys and the next free batch number"""
+    seen = new_seen_set()
+    batch_files = list_batch_files()
+    
+    # Skipping compressed batches would let their jobs be scraped and saved again
+    if zstandard is None and any(path.suffix == ".zst" for path in batch_files):
+        raise RuntimeError("found zstd-compressed batches but the zstandard package is not installed")
     
-    # Add exponential backoff for higher page numbers
-    # Every 10 pages, increase the delay by 20%
-    backoff_factor = 1.0 + (0.2 * (current_page // 10))
+    def read_batch_keys(path):
+        try:
+            return [job_key(job["title"], job["company"], job["location"]) for job in iter_batch_jobs(path)]
+        except Exception as e:
+            log_message(f"Error reading batch file {path}: {e}")
+            return []
     
-    # Cap the maximum delay at 15 seconds
-    delay = min(base_delay * backoff_factor, 15)
+    # Read and decompress the batches in parallel; the keys are collected on this thread
+    with ThreadPoolExecutor(max_workers=BATCH_READ_WORKERS) as executor:
+        for keys in executor.map(read_batch_keys, batch_files):
+            for key in keys:
+                seen.add(key)
     
-    log_message(f"Rate limiting: Waiting {delay:.2f} seconds before next request")
-    time.sleep(delay)
+    # Continue numbering after the existing batches so resumed runs don't overwrite them
+    next_batch = batch_index(batch_files[-1]) + 1 if batch_files else 1
+    
+    if seen:
+        log_message(f"Loaded {len(seen)} previously saved jobs from {len(batch_files)} batch files")
+    return seen, next_batch
 
 def save_batch(job_listings, batch_number):
-    """Save a batch of job listings to a file"""
+    """Append a batch of job listings to its JSONL file, zstd-compressed when available"""
     if not job_listings:
         return
     
-    os.makedirs(f"{DATA_DIR}/batches", exist_ok=True)
-    filename = f"{DATA_DIR}/batches/jobs_batch_{batch_number}.json"
+    # Batches are partitioned by scrape date so consumers can load just the days they need
+    partition_dir = os.path.join(BATCH_DIR, datetime.now().strftime("%Y-%m-%d"))
+    os.makedirs(partition_dir, exist_ok=True)
+    filename = f"{partition_dir}/jobs_batch_{batch_number}.jsonl"
+    
+    # One JSON document per line, appended with a single write
+    data = b"".join(json_dumps(job) + b"\n" for job in job_listings)
     
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(job_listings, f, indent=4, ensure_ascii=False)
+    # Each save appends a complete zstd frame, which readers decode across frames
+    if zstandard is not None:
+        filename += ".zst"
+        data = zstandard.ZstdCompressor(level=BATCH_COMPRESSION_LEVEL).compress(data)
+    
+    with open(filename, "ab") as f:
+        f.write(data)
     
     log_message(f"Saved {len(job_listings)} job listings to {filename}")
 
-def consolidate_data():
-    """Consolidate all batches into a single file"""
-    all_jobs = []
-    batch_dir = f"{DATA_DIR}/batches"
+@dataclass(slots=True)
+class ProgressMark:
+    """Queued behind a page's jobs so progress is only saved once those jobs are on disk"""
+    next_page: int
+    total_pages: int
+    jobs_collected: int
+
+async def batch_writer(queue, batch_number=1):
+    """Collect finished jobs from the queue and save them every BATCH_SIZE jobs"""
+    current_batch = []
     
-    if not os.path.exists(batch_dir):
-        log_message("No batches directory found")
+    try:
+        while True:
+            job = await queue.get()
+            
+            # None marks the end of the run
+            if job is None:
+                break
+            
+            # Everything queued before the mark is saved before the progress that covers it
+            if isinstance(job, ProgressMark):
+                if current_batch:
+                    save_batch(current_batch, batch_number)
+                    batch_number += 1
+                    current_batch = []
+                save_progress(job.next_page, job.total_pages, job.jobs_collected)
+                continue
+            
+            current_batch.append(job)
+            
+            # Save batch if it's full
+            if len(current_batch) >= BATCH_SIZE:
+                save_batch(current_batch, batch_number)
+                batch_number += 1
+                current_batch = []
+    finally:
+        # Save any remaining jobs in the current batch
+        if current_batch:
+            save_batch(current_batch, batch_number)
+
+async def scrape_pages_async(start_page, total_pages, jobs_collected, build_id=None, locale=None):
+    """Scrape pages start_page..total_pages, several at a time on one event loop"""
+    # Without the keys of the saved jobs the run would save duplicates, so don't start without them
+    try:
+        seen, next_batch = load_seen_jobs()
+    except Exception as e:
+        log_message(f"Error loading saved batches, not starting: {e}")
         return
     
-    for filename in os.listdir(batch_dir):
-        if filename.endswith(".json"):
-            try:
-                with open(os.path.join(batch_dir, filename), "r", encoding="utf-8") as f:
-                    batch_jobs = json.load(f)
-                    all_jobs.extend(batch_jobs)
-            except Exception as e:
-                log_message(f"Error reading batch file {filename}: {e}")
+    # Finished jobs are streamed to a single writer task that saves the batches
+    output_queue = asyncio.Queue()
+    writer = asyncio.create_task(batch_writer(output_queue, next_batch))
     
-    # Deduplicate by job ID
-    unique_jobs = {}
-    for job in all_jobs:
-        key = f"{job['title']}_{job['company']}_{job['location']}"
-        unique_jobs[key] = job
+    # Workers are spawned rather than forked so they don't inherit the event loop and sockets
+    parse_executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
     
-    all_unique_jobs = list(unique_jobs.values())
+    # First page not yet fully scraped, i.e. where a resumed run should start
+    next_page = start_page
+    pending = deque()
     
-    with open(f"{DATA_DIR}/all_jobs_consolidated.json", "w", encoding="utf-8") as f:
-        json.dump(all_unique_jobs, f, indent=4, ensure_ascii=False)
+    try:
+        async with create_identity_pool() as identities:
+            context = ScrapeContext(
+                identities=identities,
+                page_semaphore=asyncio.BoundedSemaphore(MAX_CONCURRENT_PAGES),
+                detail_limiter=AdaptiveLimiter(MAX_CONCURRENT_DETAILS),
+                bucket=AsyncTokenBucket(rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST),
+                output_queue=output_queue,
+                seen=seen,
+                parse_executor=parse_executor,
+                build_id=build_id,
+                locale=locale
+            )
+            
+            # Keep a sliding window of page tasks in flight instead of waiting for whole groups;
+            # results are still taken in page order so the saved progress has no gaps
+            try:
+                pages = iter(range(start_page, total_pages + 1))
+                for page in pages:
+                    pending.append((page, asyncio.create_task(scrape_page_async(context, page))))
+                    if len(pending) >= PAGE_WINDOW:
+                        break
+                
+                while pending:
+                    # Stop as soon as jobs can no longer be saved
+                    if writer.done():
+                        raise RuntimeError("batch writer stopped, jobs can no longer be saved")
+                    
+                    # The page stays in the window until it's done so an early stop still cancels it
+                    current_page, task = pending[0]
+                    jobs_found = await task
+                    pending.popleft()
+                    
+                    # Refill the window
+                    page = next(pages, None)
+                    if page is not None:
+                        pending.append((page, asyncio.create_task(scrape_page_async(context, page))))
+                    
+                    if jobs_found:
+                        jobs_collected += jobs_found
+                        log_message(f"Page {current_page}/{total_pages}: Found {jobs_found} jobs, total collected: {jobs_collected}")
+                    else:
+                        log_message(f"No job listings found on page {current_page}")
+                    
+                    next_page = current_page + 1
+                    
+                    # Save progress through the writer, behind the jobs of the pages it covers
+                    if current_page % PROGRESS_SAVE_INTERVAL == 0 or current_page == total_pages:
+                        await output_queue.put(ProgressMark(next_page, total_pages, jobs_collected))
+            
+            finally:
+                # Stop the pages while their sessions are still open, so they don't
+                # go on fetching details through closed sessions
+                for _, task in pending:
+                    task.cancel()
+                await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+                pending.clear()
     
-    log_message(f"Consolidated {len(all_unique_jobs)} unique job listings into all_jobs_consolidated.json")
-    return all_unique_jobs
+    except Exception as e:
+        log_message(f"Error during scraping: {e}")
+    finally:
+        parse_executor.shutdown(cancel_futures=True)
+        
+        # Let the writer save whatever is still buffered and record the pages scraped
+        # since the last periodic save; a failed writer leaves the progress where it was
+        if not writer.done():
+            await output_queue.put(ProgressMark(next_page, total_pages, jobs_collected))
+            await output_queue.put(None)
+        try:
+            await writer
+        except Exception as e:
+            log_message(f"Error saving batches, progress not saved past the failure: {e}")
+        
+        log_message(f"Scraping completed. Collected {jobs_collected} job listings")
 
 def main():
     """Main function to run the scraper"""
@@ -683,6 +1350,8 @@ def main():
     
     # Try to load previous progress
     start_page, total_pages, jobs_collected = load_progress()
+    build_id = None
+    locale = None
     
     if not start_page:
         # First run, get total pages
@@ -699,10 +1368,10 @@ def main():
             # Save the initial page for debugging
             debug_dir = os.path.join(DATA_DIR, "debug")
             os.makedirs(debug_dir, exist_ok=True)
-            with open(os.path.join(debug_dir, "initial_page.html"), 'w', encoding='utf-8') as f:
-                f.write(response.text)
+            with open(os.path.join(debug_dir, "initial_page.html"), 'wb') as f:
+                f.write(response.content)
             
-            job_data = extract_job_data(response.text)
+            job_data = extract_job_data(response.content)
             if not job_data:
                 log_message("Failed to extract initial job data. Saving raw HTML for debugging.")
                 return
@@ -712,6 +1381,8 @@ def main():
                 json.dump(job_data, f, indent=2)
             
             total_pages, total_jobs = get_total_pages(job_data)
+            build_id = job_data.get('buildId')
+            locale = job_data.get('locale')
             log_message(f"Detected {total_jobs} jobs across {total_pages} pages")
             
             start_page = 1
@@ -720,51 +1391,10 @@ def main():
             log_message(f"Error during initialization: {e}")
             return
     
-    # Set up batch processing
-    BATCH_SIZE = 100
-    current_batch = []
-    batch_number = 1
-    
     try:
-        # Scrape each page
-        for current_page in range(start_page, total_pages + 1):
-            log_message(f"Processing page {current_page}/{total_pages}...")
-            
-            # Scrape the page
-            job_listings = scrape_page(current_page)
-            
-            if job_listings:
-                current_batch.extend(job_listings)
-                jobs_collected += len(job_listings)
-                log_message(f"Page {current_page}/{total_pages}: Found {len(job_listings)} jobs, total collected: {jobs_collected}")
-                
-                # Save batch if it's full
-                if len(current_batch) >= BATCH_SIZE:
-                    save_batch(current_batch, batch_number)
-                    batch_number += 1
-                    current_batch = []
-            else:
-                log_message(f"No job listings found on page {current_page}")
-            
-            # Save progress
-            save_progress(current_page + 1, total_pages, jobs_collected)
-            
-            # Add rate limiting delay
-            add_rate_limiting_delay(current_page)
-    
+        asyncio.run(scrape_pages_async(start_page, total_pages, jobs_collected, build_id, locale))
     except KeyboardInterrupt:
         log_message("Scraping interrupted by user")
-    except Exception as e:
-        log_message(f"Error during scraping: {e}")
-    finally:
-        # Save any remaining jobs in the current batch
-        if current_batch:
-            save_batch(current_batch, batch_number)
-        
-        # Consolidate all batches into a single file
-        consolidate_data()
-        
-        log_message(f"Scraping completed. Collected {jobs_collected} job listings")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file